@@ -20,29 +20,26 @@ User Preprocessing:
 User needs to provide fire perimeter or AOI polygon
 USFS Road data needs to be downloaded locally: https://data.fs.usda.gov/geodata/edw/datasets.php?xmlKeyword=roadcore
 USGS Trails Rails and Roads needs to be downloaded from here: https://apps.nationalmap.gov/downloader/         > Transportation > File Geodatabse
-*Make sure these inputs use the same coordinate system
+*Inputs are processed and output in CONUS Albers Equal Area (EPSG:5070). Change WorkSR in the script for AOIs outside CONUS (e.g. 3338 for Alaska).
 """
 
 ###Import Libraries###
-import arcpy, os, sys, traceback
-from sys import argv
-from datetime import datetime, timezone
-from arcpy import metadata as md
-
-###Arcgis Pro Tool User Input Parameters###
-userfireperimeters = arcpy.GetParameter(0) # Feature Set: Input parameter for user-provided fire perimeters #Required
-USGS_RailFeature = arcpy.GetParameter(1) # Feature Set: Input parameter for user-provided USGS Trans rail line type #Required
-USGS_TrailSegment = arcpy.GetParameter(2) # Feature Set: Input parameter for user-provided USGS Trans trail line type #Required
-USGS_RoadSegment = arcpy.GetParameter(3) # Feature Set: Input parameter for user-provided USGS Trans Road line type #Required
-RoadCore_FS = arcpy.GetParameter(4) # Feature Set: Input parameter for user-provided USFS Roads Core line type #Required
-USFS_Road_Buff = arcpy.GetParameterAsText(5) # String value to buffer USGS roads to delete similar USFS roads that represent the same roads but have slightly similar vertices.
-USFS_RoadLineLengthToDel = arcpy.GetParameterAsText(6) # String value to erase small sections of road that buffer/erase left behind
+import arcpy, hashlib, multiprocessing, os, re, sys, traceback
+import numpy, pandas
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from datetime import datetime
+
+###Width Lookup Tables###
+#Widths were calculated using randomly sampled sections of line to calculate a rounded mean width. Update these if needed.
+USGS_RoadWidth_LUT = {1:25, 2:20, 3:15, 4:5, 5:25, 6:3, 9:2, None:None} # USGS road tnmfrc code to width, anything else gets 1000
+USFS_RoadWidth_LUT = {"1":5, "2":8, "3":10, "4":15, "5":25, None:5} # USFS road lane count to width, anything else gets 1000
+USGS_TrailWidth_LUT = {"Y":1.5} # USGS trail ohvover50inches flag to width, anything else gets 0.5
+LaneDigit = re.compile(r"(\d)") # First digit in the USFS LANES field is the lane count
 
 ###Variables###
 try:
-    # Grab & Format system date & time
-    dt = datetime.now()
-    datetime = dt.strftime("%Y%m%d_%H%M")
     #PC Directory
     scrptfolder = os.path.dirname(__file__) #Returns the UNC of the folder where this python file sits
     folder_lst = os.path.split(scrptfolder) #make a list of the head and tail of the scripts folder
@@ -50,25 +47,36 @@ try:
     #GDB
     output_fgdb = os.path.join(local_root_fld,"data","output.gdb")
     input_fgdb = os.path.join(local_root_fld,"data","input.gdb")
-    scratchworkspace = os.path.join(local_root_fld,"processing","interim.gdb")
+    #Interim data is written to the memory workspace, only final outputs and data shared with worker processes are written to disk
+    scratchworkspace = "memory"
+    cache_fgdb = os.path.join(local_root_fld,"processing","cache.gdb")
+    #AOI clipped layers can be reused between runs on the same perimeter and inputs. Off by default, only turn it on when the inputs are not edited between runs.
+    UseCache = False
+    #Bump CacheVersion whenever the clip or duplicate removal changes so older cache entries are not reused. Only the CacheKeep most recently used entries are kept in cache.gdb.
+    CacheVersion = 2
+    CacheKeep = 5
+    #AOI clipped layers that are reused between runs on the same perimeter and inputs
+    CachedFCs = ["Perims_10kmBuff","AOIClp_RailFeature","AOIClp_RoadSegment","AOI_Clp_Trails_RoadsErased","USFS_Roads_USGS_Erased"]
+    #Equal area projection all interim and output data is written in, so every buffer and length can be calculated planar in meters
+    WorkSR = arcpy.SpatialReference(5070)
+    #Size of the AOI tiles the USFS road buffer erase is run on, and how many worker processes erase tiles in parallel
+    #TileWorkers = 1 erases every tile in the ArcGIS Pro process. Parallel erasing has not been run inside ArcGIS Pro yet, so it is opt-in: set it to e.g. max(1, (os.cpu_count() or 2)//2) to try it.
+    TileSize = "10 Kilometers"
+    TileWorkers = 1
+    #On disk gdb used to hand interim data to the tile worker processes, which cannot read this process's memory workspace
+    interim_fgdb = os.path.join(local_root_fld,"processing","interim.gdb")
 
 except:
     arcpy.AddError("Variables could not be set. Exiting...")
     print("Variables could not be set. Exiting...")
-    sys.exit()
+    raise
 
-###Environment Settings###
-try:
+###Functions###
+#Function to get the environment settings the tool and its tile workers run under. They are only set inside the with block and the caller's settings are put back after, so importing or running this file does not change them.
+def work_env():
     # To allow overwriting outputs change overwriteOutput option to True.
-    arcpy.env.overwriteOutput = True
-    # Environment settings
-    arcpy.env.workspace = scratchworkspace
-except:
-    arcpy.AddError("Evironments could not be set. Exiting...")
-    print("Evironments could not be set. Exiting...")
-    sys.exit()
+    return arcpy.EnvManager(overwriteOutput=True, workspace=scratchworkspace, outputCoordinateSystem=WorkSR)
 
-###Functions###
 #Function to report any errors that occur in the IDLE or ArcPro Tool message screen
 def report_error():   
     # Get the traceback object
@@ -83,212 +91,564 @@ def report_error():
     print(pymsg)
     print(msgs)    
 
-###Start Script###
-try:
-
-    #Get inc name from input perimeter to attribute to output name
-    if arcpy.Exists(userfireperimeters):
-        with arcpy.da.SearchCursor(userfireperimeters, "attr_IncidentName") as cursor:
+#Function to delete interim processing data from the scratch workspace in one Delete call
+def purge(names):
+    existing = [os.path.join(scratchworkspace, fc) for fc in names if arcpy.Exists(os.path.join(scratchworkspace, fc))]
+    if existing:
+        arcpy.management.Delete(";".join(existing))
+
+#Function to add an attribute index on a field used in where clauses, if the data supports one and the field is not already indexed
+def add_attribute_index(fc, field):
+    try:
+        for idx in arcpy.Describe(fc).indexes:
+            if field.lower() in [f.name.lower() for f in idx.fields]:
+                return
+        arcpy.management.AddIndex(fc, field, field+"_idx")
+    except (arcpy.ExecuteError, AttributeError, OSError):
+        arcpy.AddWarning("Could not add an index on "+field+", continuing without it")
+
+#Function to delete every field that is not required or listed in keep, leaving geometry and the fields still needed downstream
+def strip_fields(fc, keep=()):
+    drop = [f.name for f in arcpy.ListFields(fc) if not f.required and f.name.lower() not in [k.lower() for k in keep]]
+    if drop:
+        arcpy.management.DeleteField(fc, drop)
+
+#Function to split a catalog path into the file gdb it is in and the feature class name, walking up out of any feature dataset. The gdb is None when the data is not in a file gdb.
+def split_gdb_path(path):
+    gdb = os.path.dirname(path)
+    while gdb and not gdb.lower().endswith(".gdb"):
+        if os.path.dirname(gdb) == gdb:
+            return None, os.path.basename(path)
+        gdb = os.path.dirname(gdb)
+    return (gdb or None), os.path.basename(path)
+
+#Function to get when an input was last modified on disk, from the newest file in its file gdb or its shapefile files. Data that is not on disk, like feature sets, returns 0.
+def modified_time(fc):
+    try:
+        path = arcpy.Describe(fc).catalogPath
+        gdb = split_gdb_path(path)[0]
+        if gdb and os.path.isdir(gdb):
+            files = [os.path.join(gdb, f) for f in os.listdir(gdb) if not f.lower().endswith(".lock")]
+        else:
+            base = os.path.splitext(path)[0]
+            files = [base+ext for ext in [".shp",".dbf"] if os.path.exists(base+ext)]
+        return max([os.path.getmtime(f) for f in files] or [0])
+    except (AttributeError, OSError):
+        return 0
+
+#Function to build a cache key from the fire perimeter geometry, the count, extent and modification time of each transportation input, and the cache version
+def aoi_cache_key(perims, inputs):
+    key = hashlib.sha1()
+    with arcpy.da.SearchCursor(perims, ["SHAPE@WKB"]) as cursor:
+        for row in cursor:
+            if row[0] is not None:
+                key.update(bytes(row[0]))
+    for fc in inputs:
+        key.update((str(arcpy.management.GetCount(fc)[0]) + str(arcpy.Describe(fc).extent) + str(modified_time(fc))).encode())
+    key.update((str(WorkSR.factoryCode) + "v" + str(CacheVersion)).encode())
+    return key.hexdigest()[:12]
+
+#Function to record that a cache entry was used and delete the entries beyond the CacheKeep most recently used ones
+def touch_cache(key):
+    index = os.path.join(os.path.dirname(cache_fgdb), "cache_keys.txt")
+    keys = []
+    if os.path.exists(index):
+        with open(index) as f:
+            keys = [k for k in f.read().split() if k != key]
+    keys.append(key)
+    for old in keys[:-CacheKeep]:
+        for fc in CachedFCs:
+            if arcpy.Exists(os.path.join(cache_fgdb, fc+"_"+old)):
+                arcpy.management.Delete(os.path.join(cache_fgdb, fc+"_"+old))
+    with open(index, "w") as f:
+        f.write("\n".join(keys[-CacheKeep:]))
+
+#Function to hash the WKB of every feature in a feature class so byte-identical geometry can be found without an overlay
+def wkb_hashes(fc):
+    hashes = set()
+    with arcpy.da.SearchCursor(fc, ["SHAPE@WKB"]) as cursor:
+        for row in cursor:
+            if row[0] is not None:
+                hashes.add(hashlib.blake2b(bytes(row[0]), digest_size=16).digest())
+    return hashes
+
+#Function to copy features, leaving out the ones whose geometry hash is already in the given set
+def erase_exact_duplicates(in_fc, hashes, out_fc):
+    arcpy.management.CopyFeatures(in_fc, out_fc)
+    with arcpy.da.UpdateCursor(out_fc, ["SHAPE@WKB"]) as cursor:
+        for row in cursor:
+            if row[0] is not None and hashlib.blake2b(bytes(row[0]), digest_size=16).digest() in hashes:
+                cursor.deleteRow()
+
+#Function to attribute a field from a lookup table keyed on another field in a single update cursor pass
+def reclass_field(fc, key_field, value_field, lut, default, field_type="DOUBLE"):
+    if not arcpy.ListFields(fc, value_field):
+        arcpy.management.AddField(fc, value_field, field_type)
+    with arcpy.da.UpdateCursor(fc, [key_field, value_field]) as cursor:
+        for row in cursor:
+            row[1] = lut.get(row[0], default)
+            cursor.updateRow(row)
+
+#Function to union a list of polygons pairwise, so each union works on two pieces of similar size instead of growing one polygon
+def union_all(geoms):
+    geoms = list(geoms)
+    while len(geoms) > 1:
+        geoms = [geoms[i].union(geoms[i + 1]) if i + 1 < len(geoms) else geoms[i] for i in range(0, len(geoms), 2)]
+    return geoms[0]
+
+#Function to erase polygons from lines one line at a time instead of as one whole-layer overlay.
+#The eraser extents are sorted by XMin so each line binary searches the slice of erasers that could reach it, and its candidates are unioned and erased with one difference.
+def iterclip_erase(in_lines, erase_polys, out_fc):
+    #Read eraser polygons and their extents into memory
+    erasers = []
+    extents = []
+    with arcpy.da.SearchCursor(erase_polys, ["SHAPE@"]) as cursor:
+        for row in cursor:
+            if row[0] is None:
+                continue
+            erasers.append(row[0])
+            ext = row[0].extent
+            extents.append((ext.XMin, ext.YMin, ext.XMax, ext.YMax))
+    extents = numpy.array(extents, dtype="f8").reshape(-1, 4)
+    order = numpy.argsort(extents[:, 0])
+    extents = extents[order]
+    erasers = [erasers[i] for i in order]
+    #No eraser starting further left than the widest eraser can reach a line
+    max_width = float((extents[:, 2] - extents[:, 0]).max()) if len(extents) else 0.0
+    #Copy the lines to the output and erase from them in place
+    arcpy.management.CopyFeatures(in_lines, out_fc)
+    with arcpy.da.UpdateCursor(out_fc, ["SHAPE@"]) as cursor:
+        for row in cursor:
+            geom = row[0]
+            if geom is None:
+                continue
+            ext = geom.extent
+            #Candidate erasers are the ones whose extent overlaps the extent of the line, only the sorted slice that can reach it in X is checked
+            lo = numpy.searchsorted(extents[:, 0], ext.XMin - max_width, "left")
+            hi = numpy.searchsorted(extents[:, 0], ext.XMax, "right")
+            window = extents[lo:hi]
+            candidates = lo + numpy.nonzero((window[:, 2] >= ext.XMin) & (window[:, 1] <= ext.YMax) & (window[:, 3] >= ext.YMin))[0]
+            if candidates.size == 0:
+                continue
+            geom = geom.difference(union_all(erasers[i] for i in candidates))
+            #Lines that were entirely inside the buffers are deleted, like PairwiseErase would drop them
+            if geom.pointCount == 0:
+                cursor.deleteRow()
+            else:
+                row[0] = geom
+                cursor.updateRow(row)
+
+#Function to erase one tile's lines with each erase polygon layer in turn and write what is left to out_fc.
+#It only uses the paths it is given, so it can run in this process or in a worker process.
+def erase_tile(tile_id, tiled_lines, erase_polys_list, out_fc):
+    with work_env():
+        lines_lyr = "tile_lines_lyr_"+str(tile_id)
+        arcpy.management.MakeFeatureLayer(tiled_lines,lines_lyr,"TileID = "+str(tile_id))
+        current = lines_lyr
+        stages = []
+        try:
+            for n, erase_polys in enumerate(erase_polys_list):
+                erase_lyr = "tile_erase_lyr_"+str(tile_id)+"_"+str(n)
+                stage = "Tiled_Lines_Erased_"+str(tile_id)+"_"+str(n)
+                arcpy.management.MakeFeatureLayer(erase_polys,erase_lyr)
+                arcpy.management.SelectLayerByLocation(erase_lyr,"INTERSECT",current,None,"NEW_SELECTION")
+                #An empty selection would make the cursors read every erase polygon, so copy the lines straight through instead
+                if arcpy.Describe(erase_lyr).FIDSet:
+                    iterclip_erase(current,erase_lyr,stage)
+                else:
+                    arcpy.management.CopyFeatures(current,stage)
+                arcpy.management.Delete(erase_lyr)
+                stages.append(stage)
+                current = stage
+                #Stop once every line in the tile has been erased
+                if int(arcpy.management.GetCount(current)[0]) == 0:
+                    break
+            arcpy.management.CopyFeatures(current,out_fc)
+        finally:
+            arcpy.management.Delete(lines_lyr)
+            purge(stages)
+        return out_fc
+
+#Function to run the buffer erase one AOI tile at a time and merge the tiles back together so the whole AOI is never erased in one go.
+#Each line is assigned to the tile nearest its centroid so lines are not cut at tile edges, and only the erase polygons touching that tile's lines are loaded.
+#The erase polygon layers are erased one after another within a tile, so put the layer that removes the most first and later layers touch less geometry.
+#When there is more than one tile and more than one worker, tiles are erased in parallel worker processes. If the worker processes die, the tiles are erased in this process instead.
+def tiled_erase(in_lines, erase_polys_list, aoi, out_fc):
+    partials = []
+    shared = []
+    tile_ids = []
+    tile_gdbs = []
+    try:
+        arcpy.cartography.GridIndexFeatures("AOI_Tiles",aoi,"INTERSECTFEATURE","","",TileSize,TileSize)
+        tile_ids = []
+        centers = []
+        with arcpy.da.SearchCursor("AOI_Tiles", ["PageNumber", "SHAPE@TRUECENTROID"]) as cursor:
             for row in cursor:
-                IncName=row[0]
-                break
-        IncName = IncName.replace(" ","")
-        arcpy.AddMessage("Incident named: "+IncName)
-    else:
-        arcpy.AddError("Input perimeter not found")
-
-
-    
-    arcpy.AddMessage("Buffering Perimeters to ID AOI")
-    #Buffer fires to designate AOI
-    arcpy.analysis.PairwiseBuffer(userfireperimeters,"Perims_10kmBuff","1 Kilometers","ALL",None,"GEODESIC","0 DecimalDegrees")
-
-    #Delete transit features based on attribution
-        #USFS roads did not need filtering, it was all road.
-        #USGS Rails did not need filtering, it was all rail.
-        #USGS roads we will need to delete "Ferry Routes" and "Tunnel" which are TNMFRC codes 7 and 8
-    arcpy.management.MakeFeatureLayer(USGS_RoadSegment,"usgs_trans_road_tnl_wtr","tnmfrc IN (7, 8)",None)
-    arcpy.management.DeleteFeatures("usgs_trans_road_tnl_wtr")
-        #USGS trails will delete Trail type = Water Trail
-    arcpy.management.MakeFeatureLayer(USGS_TrailSegment,"usgs_trans_trail_water","trailtype LIKE '%Water%'",None)
-    arcpy.management.DeleteFeatures("usgs_trans_trail_water")
+                tile_ids.append(row[0])
+                centers.append(row[1])
+        centers = numpy.array(centers, dtype="f8").reshape(-1, 2)
+        #Tag each line with its tile. On a regular grid the nearest tile center is the tile the point falls in.
+        arcpy.management.CopyFeatures(in_lines,"Tiled_Lines")
+        arcpy.management.AddField("Tiled_Lines","TileID","LONG")
+        used = set()
+        with arcpy.da.UpdateCursor("Tiled_Lines", ["SHAPE@XY", "TileID"]) as cursor:
+            for row in cursor:
+                x, y = row[0]
+                if x is None:
+                    row[1] = tile_ids[0]
+                else:
+                    row[1] = tile_ids[int(numpy.argmin((centers[:, 0] - x)**2 + (centers[:, 1] - y)**2))]
+                used.add(row[1])
+                cursor.updateRow(row)
+        tile_ids = [tile_id for tile_id in tile_ids if tile_id in used]
+        #Erase each tile on its own
+        workers = min(TileWorkers, len(tile_ids))
+        if workers > 1:
+            #Worker processes cannot see this process's memory workspace, so the tagged lines and erase polygons are handed to them through interim.gdb
+            shared = [os.path.join(interim_fgdb, os.path.basename(fc)) for fc in ["Tiled_Lines"] + list(erase_polys_list)]
+            for src, dst in zip(["Tiled_Lines"] + list(erase_polys_list), shared):
+                arcpy.management.CopyFeatures(src, dst)
+            #Every worker selects its lines by TileID
+            add_attribute_index(shared[0], "TileID")
+            #Each tile is written to its own gdb so workers never need a schema lock on the same gdb
+            for tile_id in tile_ids:
+                arcpy.management.CreateFileGDB(arcpy.env.scratchFolder,"Tile_"+str(tile_id)+".gdb")
+                tile_gdbs.append(os.path.join(arcpy.env.scratchFolder,"Tile_"+str(tile_id)+".gdb"))
+            #Script tools run inside ArcGISPro.exe, so workers are started with the python of the ArcGIS Pro environment instead
+            if not os.path.basename(sys.executable).lower().startswith("python"):
+                multiprocessing.set_executable(os.path.join(sys.exec_prefix, "pythonw.exe"))
+            arcpy.AddMessage("Erasing "+str(len(tile_ids))+" tiles with "+str(workers)+" worker processes")
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    partials = list(pool.map(erase_tile, tile_ids, repeat(shared[0]), repeat(shared[1:]), [os.path.join(gdb, "Tile_Erased") for gdb in tile_gdbs]))
+            except BrokenProcessPool:
+                arcpy.AddWarning("Tile worker processes stopped unexpectedly, erasing tiles in this process instead. Set TileWorkers = 1 in the script to skip worker processes.")
+                workers = 1
+        if workers <= 1:
+            for tile_id in tile_ids:
+                partials.append(erase_tile(tile_id,"Tiled_Lines",erase_polys_list,"Tiled_Lines_Erased_"+str(tile_id)))
+        if partials:
+            arcpy.management.Merge(partials,out_fc)
+        else:
+            arcpy.management.CopyFeatures("Tiled_Lines",out_fc)
+        arcpy.management.DeleteField(out_fc,"TileID")
+    finally:
+        #Tile gdbs are deleted whole, which also removes the partials written to them. Partials erased in this process are in the memory workspace.
+        purge(["AOI_Tiles","Tiled_Lines"] + shared + tile_gdbs + ["Tiled_Lines_Erased_"+str(tile_id) for tile_id in tile_ids])
+
+#Function to find which lines lie entirely within a distance of other lines, returned as positions in lines. Used by the pyogrio engine to match near-duplicate USFS roads.
+#Each line is tested against the union of every other line within the distance, so a road that is split into several segments in the other dataset still matches.
+def covered_lines(lines, others, distance):
+    import shapely
+    lines = numpy.asarray(lines, dtype=object)
+    others = numpy.asarray(others, dtype=object)
+    pairs = shapely.STRtree(others).query(lines, predicate="dwithin", distance=distance)
+    covered = []
+    for l, o in pandas.Series(pairs[1]).groupby(pairs[0]):
+        if shapely.covered_by(lines[l], shapely.union_all(others[o.to_numpy()]).buffer(distance)):
+            covered.append(int(l))
+    return covered
+
+#Function to run the whole workflow with GeoPandas/Shapely 2.0 and pyogrio instead of arcpy geoprocessing tools. Only used when the Engine parameter is set to pyogrio.
+#GeoPandas is not in the default ArcGIS Pro environment, so it is imported here and only needs to be installed by users who pick this engine.
+def main_pyogrio(userfireperimeters, USGS_RailFeature, USGS_TrailSegment, USGS_RoadSegment, RoadCore_FS, USFS_Road_Buff, USFS_RoadLineLengthToDel, RunTime):
+    try:
+        import geopandas, shapely
+    except ImportError:
+        arcpy.AddError("The pyogrio engine needs geopandas, shapely 2.0 and pyogrio installed in the ArcGIS Pro python environment.")
+        raise
+    #Read an input with pyogrio, only reading the columns that are used and, when a mask is given, only the features that intersect it.
+    #Feature classes in a file gdb, including ones inside a feature dataset like the USGS Transportation downloads, are read by their bare layer name.
+    #Anything that is not in a file gdb (feature sets, shapefiles, layers from other workspaces) is copied to the scratch gdb first.
+    def read(fc, name, columns, mask=None):
+        gdb, layer = split_gdb_path(arcpy.Describe(fc).catalogPath)
+        if gdb is None:
+            gdb, layer = arcpy.env.scratchGDB, "pyogrio_"+name
+            arcpy.management.CopyFeatures(fc, os.path.join(gdb, layer))
+        return geopandas.read_file(gdb, layer=layer, columns=columns, mask=mask, engine="pyogrio")
+    #Read a transportation layer inside the AOI, clip it in its own CRS and only reproject what is left
+    def read_clip(fc, name, columns, aoi):
+        gdf = read(fc, name, columns, aoi)
+        return lines_only(geopandas.clip(gdf, aoi.to_crs(gdf.crs))).to_crs(work_crs)
+    #Keep only line geometry, clipping can leave points where a line touches the AOI edge
+    def lines_only(gdf):
+        return gdf[gdf.geom_type.isin(["LineString","MultiLineString"]) & ~gdf.is_empty]
+
+    perims = read(userfireperimeters, "perims", ["attr_IncidentName"])
+    IncName = str(perims["attr_IncidentName"].iloc[0]).replace(" ","")
+    arcpy.AddMessage("Incident named: "+IncName)
+    #Everything is worked on and written in the same equal area projection as the arcpy engine so buffers and lengths are planar meters
+    work_crs = "EPSG:"+str(WorkSR.factoryCode)
+    #The AOI is buffered in meters in the work projection, geopandas reprojects it to each input's CRS when it is used as the read mask
+    aoi = geopandas.GeoSeries([shapely.union_all(perims.to_crs(work_crs).buffer(1000).values)], crs=work_crs)
 
     arcpy.AddMessage("Clipping Transportation layers to AOI")
-    #Clip all trans data to this AOI
-    arcpy.analysis.PairwiseClip(USGS_RailFeature,"Perims_10kmBuff","AOIClp_RailFeature")
-    arcpy.analysis.PairwiseClip(USGS_TrailSegment,"Perims_10kmBuff","AOIClp_TrailSegment")
-    arcpy.analysis.PairwiseClip(USGS_RoadSegment,"Perims_10kmBuff","AOIClp_RoadSegment")
-    arcpy.analysis.PairwiseClip(RoadCore_FS,"Perims_10kmBuff","AOI_Clp_RoadCore_FS")
+    #Only the features inside the AOI are read from the national datasets, then clipped and reprojected
+    rails = read_clip(USGS_RailFeature, "rails", [], aoi)
+    trails = read_clip(USGS_TrailSegment, "trails", ["trailtype","ohvover50inches"], aoi)
+    roads = read_clip(USGS_RoadSegment, "roads", ["tnmfrc"], aoi)
+    usfs = read_clip(RoadCore_FS, "usfs", ["LANES"], aoi)
+    #Delete USGS tunnels and ferry routes, and water trails
+    roads = roads[~roads["tnmfrc"].isin([7, 8])]
+    trails = trails[~trails["trailtype"].fillna("").str.contains("Water")]
 
     arcpy.AddMessage("Identifying and deleting exact duplicates")
-    #Intersect USGS Trails and roads to ID areas of exact overlap
-    arcpy.analysis.PairwiseIntersect("AOIClp_RoadSegment;AOIClp_TrailSegment","USGS_Trails_Roads_Intersect","ONLY_FID",None,"INPUT")
-    #Erase areas of intersect from trails. Erased from trails as roads take priority.
-    arcpy.analysis.PairwiseErase("AOIClp_TrailSegment","USGS_Trails_Roads_Intersect","AOI_Clp_Trails_RoadsErased",None)
-
-    #Merge USGS roads and trails as the intersection in next step only allows 2 features
-    arcpy.management.Merge("AOIClp_RoadSegment;AOI_Clp_Trails_RoadsErased","USGS_TrailsRoads_Mrg",'permanent_identifier "Permanent_Identifier" true true false 40 Text 0 0,First,#,AOIClp_RoadSegment,permanent_identifier,0,40',"NO_SOURCE_INFO")
-
-    #Intersect USGS trails and roads (merged above) with USFS roads to remove exact duplicates
-    arcpy.analysis.PairwiseIntersect("USGS_TrailsRoads_Mrg;AOI_Clp_RoadCore_FS","USGS_USFS_TransInt","ONLY_FID",None,"INPUT")
-    #Erase areas of intersect from trails. Erased from USFS as USGS roads take priority as the more authoritative dataset
-    arcpy.analysis.PairwiseErase("AOI_Clp_RoadCore_FS","USGS_USFS_TransInt","USFS_Roads_USGS_Erased")
-
-    arcpy.AddMessage("Repairing geometry")
-    #Repair geometry on both processed features
-    arcpy.management.RepairGeometry("AOI_Clp_Trails_RoadsErased","DELETE_NULL","ESRI")
-    arcpy.management.RepairGeometry("USFS_Roads_USGS_Erased","DELETE_NULL","ESRI")
-
-    ''' 
-    We now have:
-    AOIClp_RailFeature:USGS Rails with no processing done other than clipping to AOI
-    AOIClp_RoadSegment: USGS Roads with no processing done other than clipping to AOI
-    AOI_Clp_Trails_RoadsErased: USGS trails that do not share same geometry as roads
-    USFS_Roads_USGS_Erased: USFS roads that dont share the same exact geometry with USGS trails and USGS roads
-
-    At this point we have removed half of USFS roads, but tons of "duplicates" that contain slightly different verticis still exist between USGS roads and USGS trans . 
-
-    Question to review later: Do feature classes have duplicates within the FC itself? This may effect model influence so we may need to dissove roads on select fields.
-    '''
-    arcpy.AddMessage("Removing USFS roads that have similar geometry in USGS data using a "+USFS_Road_Buff+" meter buffer")
-    #To remove USFS roads that have nearly the same geometry, we must merge all USGS trans data, create a buffer, and then erase from USFS roads.
-    arcpy.management.Merge("AOI_Clp_Trails_RoadsErased;AOIClp_RoadSegment;AOIClp_RailFeature","USGS_AllMrg")
-    arcpy.analysis.PairwiseBuffer("USGS_AllMrg","USGS_AllMrg_Buffer",str(USFS_Road_Buff)+" Meters","ALL",None,"GEODESIC","0 DecimalDegrees")
-
-    #Clean up workspace/delete interim processing data so that erase has a chance to work on fed comp
-    fc_Delete = ["Perims_10kmBuff","USGS_Trails_Roads_Intersect","USGS_TrailsRoads_Mrg","AOIClp_TrailSegment","USGS_USFS_TransInt"]
-    for fc in fc_Delete:
-        fc_path = os.path.join(scratchworkspace, fc)
-        if arcpy.Exists(fc_path):
-            arcpy.Delete_management(fc_path) 
-
-
-    #Erase this buffer from USFS roads. Unfortunately we will lose buff distance of USFS roads that are not duplicates due to buffer, but other ways explored did not work.
-    #Note: Alex's fed comp did not run this well. In fact... it made a screen give out and froze the whole thing after showing a bunch of warning messages. You can run this on different sections of the AOI and merge later.
-    arcpy.analysis.PairwiseErase("USFS_Roads_USGS_Erased","USGS_AllMrg_Buffer","USFS_Roads_USGS_EraseBuff")
-
-    #Several small segments that fell outside of buffer still present. This next section of code will delete line segments <100m
-    arcpy.management.AddField("USFS_Roads_USGS_EraseBuff","LineLength","DOUBLE",None,None,None,"","NULLABLE","NON_REQUIRED","")
-    arcpy.management.CalculateGeometryAttributes("USFS_Roads_USGS_EraseBuff","LineLength LENGTH_GEODESIC","METERS","",None,"SAME_AS_INPUT")
-    arcpy.management.MakeFeatureLayer("USFS_Roads_USGS_EraseBuff","USFS_Roads_USGS_EraseBuff_SmallLinesToDelete","LineLength < "+str(USFS_RoadLineLengthToDel))
-    arcpy.management.DeleteFeatures("USFS_Roads_USGS_EraseBuff_SmallLinesToDelete")
-
-    #Clean up workspace/delete interim processing data
-    fc_Delete = ["Perims_10kmBuff","USGS_Trails_Roads_Intersect","USGS_TrailsRoads_Mrg","USGS_AllMrg","USGS_AllMrg_Buffer","AOI_Clp_RoadCore_FS","AOIClp_TrailSegment","USGS_USFS_TransInt","USFS_Roads_USGS_Erased"]
-    for fc in fc_Delete:
-        fc_path = os.path.join(scratchworkspace, fc)
-        if arcpy.Exists(fc_path):
-            arcpy.Delete_management(fc_path) 
-except:
-    arcpy.AddError("Error Preprocessing. Exiting.")
-    print("Error Preprocessing. Exiting.")
-    #Clean up workspace/delete interim processing data
-    fc_Delete = ["Perims_10kmBuff","USGS_Trails_Roads_Intersect","USGS_TrailsRoads_Mrg","USGS_AllMrg","USGS_AllMrg_Buffer","AOI_Clp_RoadCore_FS","AOIClp_TrailSegment","USGS_USFS_TransInt","USFS_Roads_USGS_Erased","AOI_Clp_Trails_RoadsErased","AOIClp_RailFeature","AOIClp_RoadSegment","USFS_Roads_USGS_EraseBuff"]
-    for fc in fc_Delete:
-        fc_path = os.path.join(scratchworkspace, fc)
-        if arcpy.Exists(fc_path):
-            arcpy.Delete_management(fc_path) 
-    report_error()
-    sys.exit()
-
-
-#This next section attributes a width to line segments and merges the output into one feature class that can be found in the output folder.
-try:
-    #Dissolve the data based on the only field we care about, that will be used to attribute width. This will also remove overlapping duplicates.
-    arcpy.analysis.PairwiseDissolve("AOIClp_RoadSegment","AOIClp_USGS_Road_TNMFRC_Diss","tnmfrc",None,"MULTI_PART","")
-    ####Attribute Width to USGS Roads
-    arcpy.management.CalculateField("AOIClp_USGS_Road_TNMFRC_Diss","Width","Reclass(!tnmfrc!)","PYTHON3",
-        code_block="""def Reclass(tnmfrc):
-        if tnmfrc == 1:
-            return 25
-        elif tnmfrc == 2:
-            return 20
-        elif tnmfrc == 3:
-            return 15
-        elif tnmfrc == 4:
-            return 5
-        elif tnmfrc == 5:
-            return 25
-        elif tnmfrc == 6:
-            return 3
-        elif tnmfrc == 9:
-            return 2
-        elif tnmfrc is None:
-            return None
-        else: 
-            return 1000""",
-        field_type="DOUBLE",enforce_domains="NO_ENFORCE_DOMAINS")
-
-    #Now for USFS roads create a new simplified field containing just a number for lane width
-    arcpy.management.CalculateField("USFS_Roads_USGS_EraseBuff","LaneWidth","rcls(!LANES!)","PYTHON3",
-    """def rcls(lanes):
-    for char in str(lanes):
-        if char.isdigit():
-            return char
-        else:
-            return None""","TEXT","NO_ENFORCE_DOMAINS")
-    #Dissolve only based on lane width for simplified dataset
-    arcpy.analysis.PairwiseDissolve("USFS_Roads_USGS_EraseBuff","USFS_Roads_Diss_ALL","LaneWidth",None,"MULTI_PART","")
+    #Erase the sections trails share with roads, like the intersect and erase of the arcpy engine. Each trail is differenced once against the union of the roads it touches.
+    trails = trails.reset_index(drop=True)
+    pairs = roads.sindex.query(trails.geometry.values, predicate="intersects")
+    if pairs.shape[1]:
+        trail_geoms = numpy.asarray(trails.geometry.values, dtype=object)
+        road_geoms = numpy.asarray(roads.geometry.values, dtype=object)
+        for t, r in pandas.Series(pairs[1]).groupby(pairs[0]):
+            trail_geoms[t] = shapely.difference(trail_geoms[t], shapely.union_all(road_geoms[r.to_numpy()]))
+        trails = lines_only(trails.set_geometry(geopandas.GeoSeries(trail_geoms, index=trails.index, crs=work_crs)))
+    #USFS roads that are exact duplicates of USGS roads and trails are dropped by WKB
+    usgs_wkb = set(roads.geometry.to_wkb())
+    usgs_wkb.update(trails.geometry.to_wkb())
+    usfs = usfs[~usfs.geometry.to_wkb().isin(usgs_wkb)]
+
+    arcpy.AddMessage("Removing USFS roads that have similar geometry in USGS data within "+USFS_Road_Buff+" meters")
+    #Each USFS road is dropped when it lies entirely within the buffer distance of the union of all USGS lines near it.
+    #Whole roads are kept or dropped, so there is no buffer erase cutting roads that cross USGS lines and no small leftover sections to delete.
+    usgs = pandas.concat([roads.geometry, trails.geometry, rails.geometry], ignore_index=True)
+    usfs = usfs.reset_index(drop=True)
+    if len(usgs) and len(usfs):
+        usfs = usfs.drop(index=covered_lines(usfs.geometry.values, usgs.values, float(USFS_Road_Buff)))
+
+    arcpy.AddMessage("Attributing width")
+    roads = roads.assign(Width=[USGS_RoadWidth_LUT.get(None if pandas.isna(v) else v, 1000) for v in roads["tnmfrc"]], Source="USGS_Road")
+    lanes = usfs["LANES"].astype(str).str.extract(LaneDigit, expand=False)
+    usfs = usfs.assign(Width=[USFS_RoadWidth_LUT.get(None if pandas.isna(v) else v, 1000) for v in lanes], Source="USFS_Road")
+    trails = trails.assign(Width=[USGS_TrailWidth_LUT.get(v, 0.5) for v in trails["ohvover50inches"]], Source="USGS_Trail")
+    rails = rails.assign(Width=8.0, Source="USGS_Rail")
+    #Merge and dissolve and put it in output gdb
+    merged = geopandas.GeoDataFrame(pandas.concat([gdf[["Source","Width","geometry"]] for gdf in [usfs, roads, trails, rails]], ignore_index=True), crs=work_crs)
+    out = merged.dissolve(by=["Source","Width"], dropna=False).reset_index()
+    out_name = os.path.basename(arcpy.CreateUniqueName("transprtn_cntmnt_"+IncName+"_"+RunTime, output_fgdb))
+    out.to_file(output_fgdb, layer=out_name, driver="OpenFileGDB", engine="pyogrio")
+    arcpy.AddMessage("Script Finished Running, Output located here: "+str(os.path.join(output_fgdb,out_name)))
+
+###Start Script###
+#Function that runs the tool. Everything above only defines settings and functions, so this file can be imported by worker processes or other scripts without running the tool.
+#Errors are reported and raised instead of exiting, so a script calling run for several incidents can handle them.
+def run(userfireperimeters, USGS_RailFeature, USGS_TrailSegment, USGS_RoadSegment, RoadCore_FS, USFS_Road_Buff, USFS_RoadLineLengthToDel, Engine="arcpy"):
+    # Grab & Format system date & time for the output name, once per run
+    RunTime = datetime.now().strftime("%Y%m%d_%H%M")
+    with work_env():
+        #The pyogrio engine runs the whole workflow on its own and returns, the rest of the function is the arcpy engine
+        if Engine == "pyogrio":
+            try:
+                main_pyogrio(userfireperimeters, USGS_RailFeature, USGS_TrailSegment, USGS_RoadSegment, RoadCore_FS, USFS_Road_Buff, USFS_RoadLineLengthToDel, RunTime)
+            except:
+                arcpy.AddError("Error running pyogrio engine. Exiting.")
+                print("Error running pyogrio engine. Exiting.")
+                report_error()
+                raise
+            return
+
+        # Cache gdb is created the first time the tool runs with the cache turned on
+        if UseCache and not arcpy.Exists(cache_fgdb):
+            arcpy.management.CreateFileGDB(os.path.dirname(cache_fgdb),os.path.basename(cache_fgdb))
+
+        try:
+
+            #Get inc name from input perimeter to attribute to output name
+            if arcpy.Exists(userfireperimeters):
+                #Only the first row is needed, so take it from the cursor and let the rest of the table go unread
+                IncName = str(next(iter(arcpy.da.SearchCursor(userfireperimeters, ["attr_IncidentName"])))[0]).replace(" ","")
+                arcpy.AddMessage("Incident named: "+IncName)
+            else:
+                arcpy.AddError("Input perimeter not found")
+
 
     
-    ####Attribute width to USFS roads
-    arcpy.management.CalculateField("USFS_Roads_Diss_ALL","Width","Reclass(!LaneWidth!)","PYTHON3","""def Reclass(LaneWidth):
-    if LaneWidth == "1":
-        return 5
-    elif LaneWidth == "2":
-        return 8
-    elif LaneWidth == "3":
-        return 10
-    elif LaneWidth == "4":
-        return 15
-    elif LaneWidth == "5":
-        return 25
-    elif LaneWidth is None:
-        return 5
-    else: 
-        return 1000""","DOUBLE","NO_ENFORCE_DOMAINS")
-    ####Attribute width to USGS rail
-    arcpy.management.CalculateField("AOIClp_RailFeature","Width","8","PYTHON3","","DOUBLE","NO_ENFORCE_DOMAINS")
-    arcpy.analysis.PairwiseDissolve("AOIClp_RailFeature","AOIClp_Rail_Diss","Width",None,"MULTI_PART","")
-
-    #TRAILS
-    arcpy.management.AddField("AOI_Clp_Trails_RoadsErased","Width","DOUBLE",None,None,None,"","NULLABLE","NON_REQUIRED","")
-    ####Attribute width to USGS trail
-    arcpy.management.CalculateField("AOI_Clp_Trails_RoadsErased","Width","Reclass(!ohvover50inches!)","PYTHON3","""def Reclass(ohvover50inches):
-        if ohvover50inches == "Y":
-            return 1.5
-        elif ohvover50inches is None:
-            return 0.5
-        else: 
-            return 0.5""","TEXT","NO_ENFORCE_DOMAINS")
-
-    arcpy.analysis.PairwiseDissolve("AOI_Clp_Trails_RoadsErased","AOI_Clp_Trails_Diss","Width",None,"MULTI_PART","")
-    #Caculate field to track data source
-    arcpy.management.CalculateField("AOIClp_Rail_Diss","Source",'"USGS_Rail"',"PYTHON3","","TEXT","NO_ENFORCE_DOMAINS")
-    arcpy.management.CalculateField("AOI_Clp_Trails_Diss","Source",'"USGS_Trail"',"PYTHON3","","TEXT","NO_ENFORCE_DOMAINS")
-    arcpy.management.CalculateField("AOIClp_USGS_Road_TNMFRC_Diss","Source",'"USGS_Road"',"PYTHON3","","TEXT","NO_ENFORCE_DOMAINS")
-    arcpy.management.CalculateField("USFS_Roads_Diss_ALL","Source",'"USFS_Road"',"PYTHON3","","TEXT","NO_ENFORCE_DOMAINS")
-    #Merge and dissolve and put it in output gdb
-    arcpy.management.Merge("USFS_Roads_Diss_ALL;AOIClp_USGS_Road_TNMFRC_Diss;AOI_Clp_Trails_Diss;AOIClp_Rail_Diss","trans_usgs_usfs_containment",'Width "Width" true true false 8 Double 0 0,First,#,USFS_Roads_Diss_ALL,Width,-1,-1,AOIClp_USGS_Road_TNMFRC_Diss,Width,-1,-1,AOI_Clp_Trails_Diss,Width,-1,-1,AOIClp_Rail_Diss,Width,-1,-1;Source "Source" true true false 512 Text 0 0,First,#,USFS_Roads_Diss_ALL,Source,0,512,AOIClp_USGS_Road_TNMFRC_Diss,Source,0,512,AOI_Clp_Trails_Diss,Source,0,512,AOIClp_Rail_Diss,Source,0,512',"NO_SOURCE_INFO")
-    arcpy.analysis.PairwiseDissolve("trans_usgs_usfs_containment",(os.path.join(output_fgdb,"transprtn_cntmnt_"+IncName+"_"+datetime)),"Source;Width",None,"MULTI_PART","")
-
-    #Clean up workspace/delete interim processing data
-    fc_Delete = ["AOI_Clp_Trails_Diss","AOI_Clp_Trails_RoadsErased","AOIClp_Rail_Diss","AOIClp_RailFeature","AOIClp_RoadSegment","AOIClp_USGS_Road_TNMFRC_Diss","USFS_Roads_Diss_ALL","USFS_Roads_USGS_EraseBuff"]
-    for fc in fc_Delete:
-        fc_path = os.path.join(scratchworkspace, fc)
-        if arcpy.Exists(fc_path):
-            arcpy.Delete_management(fc_path) 
-    #"trans_usgs_usfs_containment"
-    arcpy.AddMessage("Script Finished Running, Output located here: "+str(os.path.join(output_fgdb,"trans_usgs_usfs_containment_"+datetime)))
+            #Delete transit features based on attribution
+                #USFS roads did not need filtering, it was all road.
+                #USGS Rails did not need filtering, it was all rail.
+                #USGS roads we will need to delete "Ferry Routes" and "Tunnel" which are TNMFRC codes 7 and 8
+                #The national inputs are large, so the fields queried are indexed once. File gdb feature classes already keep a spatial index for the clips.
+            add_attribute_index(USGS_RoadSegment,"tnmfrc")
+            add_attribute_index(USGS_TrailSegment,"trailtype")
+            with arcpy.da.UpdateCursor(USGS_RoadSegment,["OID@"],"tnmfrc IN (7, 8)") as cursor:
+                for row in cursor:
+                    cursor.deleteRow()
+                #USGS trails will delete Trail type = Water Trail
+            with arcpy.da.UpdateCursor(USGS_TrailSegment,["OID@"],"trailtype LIKE '%Water%'") as cursor:
+                for row in cursor:
+                    cursor.deleteRow()
+
+            #The AOI clip and exact duplicate removal do not depend on the buffer or line length parameters, so when UseCache is on their outputs are cached by perimeter and inputs.
+            #The key is built after the attribute deletes above so it does not change between runs on the same inputs.
+            CacheKey = aoi_cache_key(userfireperimeters,[USGS_RailFeature,USGS_TrailSegment,USGS_RoadSegment,RoadCore_FS]) if UseCache else None
+            if UseCache and all(arcpy.Exists(os.path.join(cache_fgdb, fc+"_"+CacheKey)) for fc in CachedFCs):
+                arcpy.AddMessage("Reusing AOI clipped transportation layers from cache: "+CacheKey)
+                for fc in CachedFCs:
+                    arcpy.management.CopyFeatures(os.path.join(cache_fgdb, fc+"_"+CacheKey), fc)
+                touch_cache(CacheKey)
+            else:
+                arcpy.AddMessage("Buffering Perimeters to ID AOI")
+                #Project the perimeters once so the AOI and every layer clipped to it are in the working projection
+                arcpy.management.Project(userfireperimeters,"Perims_Proj",WorkSR)
+                #Buffer fires to designate AOI
+                arcpy.analysis.PairwiseBuffer("Perims_Proj","Perims_10kmBuff","1 Kilometers","ALL",None,"PLANAR","0 DecimalDegrees")
+                purge(["Perims_Proj"])
+
+                arcpy.AddMessage("Clipping Transportation layers to AOI")
+                #Clip all trans data to this AOI
+                arcpy.analysis.PairwiseClip(USGS_RailFeature,"Perims_10kmBuff","AOIClp_RailFeature")
+                arcpy.analysis.PairwiseClip(USGS_TrailSegment,"Perims_10kmBuff","AOIClp_TrailSegment")
+                arcpy.analysis.PairwiseClip(USGS_RoadSegment,"Perims_10kmBuff","AOIClp_RoadSegment")
+                arcpy.analysis.PairwiseClip(RoadCore_FS,"Perims_10kmBuff","AOI_Clp_RoadCore_FS")
+                #Only the fields used to attribute width are carried forward, so every later copy, hash, buffer and tile hand off moves less data
+                strip_fields("AOIClp_RailFeature")
+                strip_fields("AOIClp_TrailSegment",["ohvover50inches"])
+                strip_fields("AOIClp_RoadSegment",["tnmfrc"])
+                strip_fields("AOI_Clp_RoadCore_FS",["LANES"])
+
+                arcpy.AddMessage("Identifying and deleting exact duplicates")
+                #Intersect USGS Trails and roads to ID areas of exact overlap. Trails only go through this step, so shared sections that are split or digitized differently are still erased.
+                arcpy.analysis.PairwiseIntersect("AOIClp_RoadSegment;AOIClp_TrailSegment","USGS_Trails_Roads_Intersect","ONLY_FID",None,"INPUT")
+                #Erase areas of intersect from trails. Erased from trails as roads take priority.
+                arcpy.analysis.PairwiseErase("AOIClp_TrailSegment","USGS_Trails_Roads_Intersect","AOI_Clp_Trails_RoadsErased",None)
+                purge(["USGS_Trails_Roads_Intersect"])
+
+                #USFS roads that are exact duplicates have byte-identical geometry, so they are found by hashing the WKB of each feature instead of intersecting and erasing. Partial overlaps are left to the USGS buffer erase below.
+                #Delete USFS roads that are exact duplicates of USGS trails and roads. Deleted from USFS as USGS roads take priority as the more authoritative dataset
+                USGS_Hashes = wkb_hashes("AOIClp_RoadSegment") | wkb_hashes("AOI_Clp_Trails_RoadsErased")
+                erase_exact_duplicates("AOI_Clp_RoadCore_FS",USGS_Hashes,"USFS_Roads_USGS_Erased")
+
+                #Store the clipped layers for later runs on the same incident
+                if UseCache:
+                    for fc in CachedFCs:
+                        arcpy.management.CopyFeatures(fc, os.path.join(cache_fgdb, fc+"_"+CacheKey))
+                    touch_cache(CacheKey)
+
+            ''' 
+            We now have:
+            AOIClp_RailFeature:USGS Rails with no processing done other than clipping to AOI
+            AOIClp_RoadSegment: USGS Roads with no processing done other than clipping to AOI
+            AOI_Clp_Trails_RoadsErased: USGS trails that do not share same geometry as roads
+            USFS_Roads_USGS_Erased: USFS roads that dont share the same exact geometry with USGS trails and USGS roads
+
+            At this point we have removed half of USFS roads, but tons of "duplicates" that contain slightly different verticis still exist between USGS roads and USGS trans . 
+
+            Question to review later: Do feature classes have duplicates within the FC itself? This may effect model influence so we may need to dissove roads on select fields.
+            '''
+            arcpy.AddMessage("Removing USFS roads that have similar geometry in USGS data using a "+USFS_Road_Buff+" meter buffer")
+            #To remove USFS roads that have nearly the same geometry, we must buffer all USGS trans data and then erase from USFS roads.
+            #Each USGS layer is buffered on its own instead of merged first, and buffers are not dissolved so each USGS line keeps its own small buffer polygon for the per-line erase below.
+            USGS_Buffers = ["USGS_Road_Buffer","USGS_Trail_Buffer","USGS_Rail_Buffer"]
+            arcpy.analysis.PairwiseBuffer("AOIClp_RoadSegment","USGS_Road_Buffer",str(USFS_Road_Buff)+" Meters","NONE",None,"PLANAR","0 DecimalDegrees")
+            arcpy.analysis.PairwiseBuffer("AOI_Clp_Trails_RoadsErased","USGS_Trail_Buffer",str(USFS_Road_Buff)+" Meters","NONE",None,"PLANAR","0 DecimalDegrees")
+            arcpy.analysis.PairwiseBuffer("AOIClp_RailFeature","USGS_Rail_Buffer",str(USFS_Road_Buff)+" Meters","NONE",None,"PLANAR","0 DecimalDegrees")
+            #The erase only needs buffer geometry
+            for fc in USGS_Buffers:
+                strip_fields(fc)
+
+            #Clean up workspace/delete interim processing data so that erase has a chance to work on fed comp
+            purge(["AOIClp_TrailSegment"])
+
+
+            #Erase these buffers from USFS roads, roads first as they remove the most. Unfortunately we will lose buff distance of USFS roads that are not duplicates due to buffer, but other ways explored did not work.
+            #Note: A whole-layer PairwiseErase against one dissolved buffer froze Alex's fed comp, so each USFS road is now only erased by the USGS buffers whose extent it overlaps.
+            #The AOI is also split into tiles that are erased separately, in parallel when possible, and merged, so each process only holds one tile's buffers in memory.
+            #Geometry is only repaired if the erase fails on it, then the erase is tried once more
+            try:
+                tiled_erase("USFS_Roads_USGS_Erased",USGS_Buffers,"Perims_10kmBuff","USFS_Roads_USGS_EraseBuff")
+            except (arcpy.ExecuteError, RuntimeError):
+                arcpy.AddWarning("Erase failed, repairing geometry and trying again")
+                for fc in ["USFS_Roads_USGS_Erased"] + USGS_Buffers:
+                    arcpy.management.RepairGeometry(fc,"DELETE_NULL","ESRI")
+                tiled_erase("USFS_Roads_USGS_Erased",USGS_Buffers,"Perims_10kmBuff","USFS_Roads_USGS_EraseBuff")
+
+            #Several small segments that fell outside of buffer still present. This next section of code will delete line segments <100m
+            #Length is checked and short lines deleted in one cursor pass
+            MinLineLength = float(USFS_RoadLineLengthToDel)
+            with arcpy.da.UpdateCursor("USFS_Roads_USGS_EraseBuff",["SHAPE@"]) as cursor:
+                for row in cursor:
+                    if row[0] is None or row[0].getLength("PLANAR","METERS") < MinLineLength:
+                        cursor.deleteRow()
+
+            #Free memory used by interim processing data that the width attribution does not need
+            purge(["Perims_10kmBuff"] + USGS_Buffers + ["AOI_Clp_RoadCore_FS","AOIClp_TrailSegment","USFS_Roads_USGS_Erased"])
+        except:
+            arcpy.AddError("Error Preprocessing. Exiting.")
+            print("Error Preprocessing. Exiting.")
+            #Clean up workspace/delete interim processing data
+            arcpy.management.Delete("memory")
+            report_error()
+            raise
+
+
+        #This next section attributes a width to line segments and merges the output into one feature class that can be found in the output folder.
+        try:
+            #Width and Source are attributed on each clipped layer, then everything is merged and dissolved once on Source and Width. The dissolve also removes overlapping duplicates.
+            ####Attribute Width to USGS Roads
+            reclass_field("AOIClp_RoadSegment","tnmfrc","Width",USGS_RoadWidth_LUT,1000)
+
+            #Now for USFS roads create a new simplified field containing just a number for lane width
+            #The whole LANES column is read at once and the digit is extracted with one regex pass, then written back joined on ObjectID
+            arcpy.management.AddField("USFS_Roads_USGS_EraseBuff","LaneWidth","TEXT")
+            oid_field = arcpy.Describe("USFS_Roads_USGS_EraseBuff").OIDFieldName
+            lanes = pandas.DataFrame(arcpy.da.FeatureClassToNumPyArray("USFS_Roads_USGS_EraseBuff",[oid_field,"LANES"],null_value={"LANES":""}))
+            lanes["LaneWidth"] = lanes["LANES"].astype(str).str.extract(LaneDigit,expand=False)
+            #Features without a digit are left out so their LaneWidth stays null
+            lanes = lanes.dropna(subset=["LaneWidth"])
+            if not lanes.empty:
+                lane_arr = numpy.array(list(zip(lanes[oid_field],lanes["LaneWidth"])),dtype=[("LaneOID","<i4"),("LaneWidth","<U1")])
+                arcpy.da.ExtendTable("USFS_Roads_USGS_EraseBuff",oid_field,lane_arr,"LaneOID",append_only=False)
+
+            ####Attribute width to USFS roads
+            reclass_field("USFS_Roads_USGS_EraseBuff","LaneWidth","Width",USFS_RoadWidth_LUT,1000)
+            ####Attribute width to USGS rail. All rail is the same width, so the lookup is empty and every line gets the default in the same cursor pass as the other layers.
+            reclass_field("AOIClp_RailFeature","OID@","Width",{},8)
+
+            #TRAILS
+            ####Attribute width to USGS trail
+            reclass_field("AOI_Clp_Trails_RoadsErased","ohvover50inches","Width",USGS_TrailWidth_LUT,0.5)
+
+            #Stamp field to track data source, a constant is written with a cursor so no expression is compiled
+            for fc, src in [("AOIClp_RailFeature","USGS_Rail"),
+                            ("AOI_Clp_Trails_RoadsErased","USGS_Trail"),
+                            ("AOIClp_RoadSegment","USGS_Road"),
+                            ("USFS_Roads_USGS_EraseBuff","USFS_Road")]:
+                arcpy.management.AddField(fc,"Source","TEXT",field_length=16)
+                with arcpy.da.UpdateCursor(fc,["Source"]) as cursor:
+                    for row in cursor:
+                        row[0] = src
+                        cursor.updateRow(row)
+            #Merge only Width and Source from the undissolved layers, then dissolve once and put it in output gdb. A run that finishes in the same minute as an earlier one on the same incident gets a numbered name instead of overwriting it.
+            OutFC = arcpy.CreateUniqueName("transprtn_cntmnt_"+IncName+"_"+RunTime, output_fgdb)
+            arcpy.management.Merge("USFS_Roads_USGS_EraseBuff;AOIClp_RoadSegment;AOI_Clp_Trails_RoadsErased;AOIClp_RailFeature","trans_usgs_usfs_containment",'Width "Width" true true false 8 Double 0 0,First,#,USFS_Roads_USGS_EraseBuff,Width,-1,-1,AOIClp_RoadSegment,Width,-1,-1,AOI_Clp_Trails_RoadsErased,Width,-1,-1,AOIClp_RailFeature,Width,-1,-1;Source "Source" true true false 512 Text 0 0,First,#,USFS_Roads_USGS_EraseBuff,Source,0,512,AOIClp_RoadSegment,Source,0,512,AOI_Clp_Trails_RoadsErased,Source,0,512,AOIClp_RailFeature,Source,0,512',"NO_SOURCE_INFO")
+            arcpy.analysis.PairwiseDissolve("trans_usgs_usfs_containment",OutFC,"Source;Width",None,"MULTI_PART","")
+
+            #Clean up workspace/delete interim processing data
+            arcpy.management.Delete("memory")
+            #"trans_usgs_usfs_containment"
+            arcpy.AddMessage("Script Finished Running, Output located here: "+str(OutFC))
     
-except:
-    arcpy.AddError("Error Attributing Width. Exiting.")
-    print("Error Attributing Width. Exiting.")
-    #Clean up workspace/delete interim processing data
-    fc_Delete = ["AOI_Clp_Trails_Diss","AOI_Clp_Trails_RoadsErased","AOIClp_Rail_Diss","AOIClp_RailFeature","AOIClp_RoadSegment","AOIClp_USGS_Road_TNMFRC_Diss","trans_usgs_usfs_containment","USFS_Roads_Diss_ALL","USFS_Roads_USGS_EraseBuff"]
-    for fc in fc_Delete:
-        fc_path = os.path.join(scratchworkspace, fc)
-        if arcpy.Exists(fc_path):
-            arcpy.Delete_management(fc_path) 
-    report_error()
-    sys.exit()
+        except:
+            arcpy.AddError("Error Attributing Width. Exiting.")
+            print("Error Attributing Width. Exiting.")
+            #Clean up workspace/delete interim processing data
+            arcpy.management.Delete("memory")
+            report_error()
+            raise
+
+
+###Arcgis Pro Tool User Input Parameters###
+if __name__ == "__main__":
+    userfireperimeters = arcpy.GetParameter(0) # Feature Set: Input parameter for user-provided fire perimeters #Required
+    USGS_RailFeature = arcpy.GetParameter(1) # Feature Set: Input parameter for user-provided USGS Trans rail line type #Required
+    USGS_TrailSegment = arcpy.GetParameter(2) # Feature Set: Input parameter for user-provided USGS Trans trail line type #Required
+    USGS_RoadSegment = arcpy.GetParameter(3) # Feature Set: Input parameter for user-provided USGS Trans Road line type #Required
+    RoadCore_FS = arcpy.GetParameter(4) # Feature Set: Input parameter for user-provided USFS Roads Core line type #Required
+    USFS_Road_Buff = arcpy.GetParameterAsText(5) # String value to buffer USGS roads to delete similar USFS roads that represent the same roads but have slightly similar vertices.
+    USFS_RoadLineLengthToDel = arcpy.GetParameterAsText(6) # String value to erase small sections of road that buffer/erase left behind
+    Engine = arcpy.GetParameterAsText(7) or "arcpy" # String value, "arcpy" (default) runs the geoprocessing tools, "pyogrio" runs the GeoPandas/pyogrio workflow #Optional
+
+    #Errors are already reported by run, only the tool exits
+    try:
+        run(userfireperimeters, USGS_RailFeature, USGS_TrailSegment, USGS_RoadSegment, RoadCore_FS, USFS_Road_Buff, USFS_RoadLineLengthToDel, Engine)
+    except:
+        sys.exit(1)